@@ -1,149 +1,431 @@
-import pdfplumber
 import fitz  # PyMuPDF
+import argparse
 import json
+import csv
+import logging
 from colorama import init, Fore, Back, Style
-import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import chain, product, repeat
+from operator import itemgetter
 from pathlib import Path
 import re
 
+try:
+    import orjson
+except ImportError:  # optional: much faster JSON encoding when installed
+    orjson = None
+
 # Initialize colorama for colored terminal output
 init(autoreset=True)
 
+# Progress and debugging details; silent unless --verbose is given
+logger = logging.getLogger("pdf-extra-high")
+_LOG_FORMAT = '%(message)s'
+
+
+# Documents with more pages than this are processed in a pool of worker processes
+_PARALLEL_PAGE_THRESHOLD = 50
+# Upper bound on worker processes; per-page extraction stops scaling beyond a few
+_MAX_WORKERS = 4
+
+# Below this many words on a page, geometry filters run in plain Python
+_VECTORIZE_MIN_WORDS = 32
+
+# Text extraction flags: the defaults for words, but with ligatures such as
+# "fi" expanded into separate letters, so words match plain-letter text
+_TEXTPAGE_FLAGS = fitz.TEXTFLAGS_WORDS & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Runs of whitespace, collapsed to a single space when cleaning text
+_WS_RE = re.compile(r'\s+')
+# A hyphen followed by whitespace: a word broken across lines. Besides the
+# ASCII hyphen, PDFs mark such breaks with a soft hyphen (U+00AD) or a
+# non-breaking hyphen (U+2011).
+_LINE_BREAK_HYPHEN_RE = re.compile(r'[-\u00ad\u2011]\s+')
+# Deletes soft hyphens left inside words, which are invisible when rendered
+_SOFT_HYPHEN_TABLE = str.maketrans('', '', '\u00ad')
+# Whitespace before punctuation, dropped when cleaning text
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([.,;:!?])')
+
+# Short words that are always complete, never the visible part of a longer one
+_COMPLETE_WORDS = frozenset(['the', 'and', 'of', 'to', 'in', 'for', 'with', 'a', 'an', 'is', 'are', 'was', 'were'])
+# Consonant clusters that suggest a word was cut off before more letters
+_INCOMPLETE_ENDINGS = ('th', 'st', 'nd', 'rd', 'ch', 'sh', 'nt', 'mp', 'ck', 'ng')
+# Typical endings of complete words
+_COMMON_ENDINGS = ('ed', 'ing', 'er', 'est', 'ly', 'ion', 'tion', 'ment', 'ness', 'ful', 'less', 'able', 'ible')
+
+# What the PyMuPDF text calls raise for content MuPDF cannot handle
+_MUPDF_ERRORS = (RuntimeError, ValueError)
+
+# Annotation subtypes reported as annotations, passed to MuPDF so it skips the rest
+_ANNOTATION_TYPES = (
+    fitz.PDF_ANNOT_HIGHLIGHT, fitz.PDF_ANNOT_SQUIGGLY, fitz.PDF_ANNOT_STRIKE_OUT,
+    fitz.PDF_ANNOT_UNDERLINE, fitz.PDF_ANNOT_FREE_TEXT, fitz.PDF_ANNOT_TEXT,
+)
+# Text markup subtypes, which mark words with quads rather than their whole rect
+_TEXT_MARKUP_TYPES = frozenset(['Highlight', 'Underline', 'StrikeOut', 'Squiggly'])
+
+# CSV columns: the category, then the keys of an annotation or highlight record
+_CSV_FIELDNAMES = ['category', 'page', 'text', 'color', 'type', 'coordinates', 'y_position']
+
+# Named highlight colors, in the order their thresholds are tested
+_COLOR_NAMES = ('yellow', 'green', 'blue', 'pink', 'orange', 'red', 'cyan')
+
+
+def _color_ladder(rgb):
+    """Evaluate the color thresholds on an (N, 3) array of 0-1 RGB values.
+
+    Returns an index into _COLOR_NAMES per row, or -1 when no named color matches.
+    """
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    conditions = [
+        (r > 0.7) & (g > 0.7) & (b < 0.6),  # yellow
+        (r < 0.6) & (g > 0.7) & (b < 0.6),  # green
+        (r < 0.6) & (g < 0.8) & (b > 0.7),  # blue
+        (r > 0.7) & (g < 0.6) & (b > 0.7),  # pink
+        (r > 0.8) & (g > 0.5) & (b < 0.5),  # orange
+        (r > 0.7) & (g < 0.5) & (b < 0.5),  # red
+        (r < 0.5) & (g > 0.7) & (b > 0.7),  # cyan
+    ]
+    return np.select(conditions, range(len(_COLOR_NAMES)), default=-1)
+
+
+# Every threshold the ladder compares a channel against. A channel's value
+# only matters through which edge interval it falls in, or which edge it sits
+# on, giving 9 bins per channel: even bins between edges, odd bins on one.
+_COLOR_EDGES = (0.5, 0.6, 0.7, 0.8)
+_COLOR_BIN_VALUES = (0.25, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.9)
+
+# Ladder result for every combination of channel bins, indexed [r_bin, g_bin, b_bin]
+_COLOR_LUT = _color_ladder(
+    np.array(list(product(_COLOR_BIN_VALUES, repeat=3)))
+).astype(np.int8).reshape(9, 9, 9)
+
+
+# The same table flattened to color names (None where no name matches), so
+# the per-annotation path is one tuple index, see _rgb_to_color_name
+_COLOR_NAME_LUT = tuple(
+    _COLOR_NAMES[color_index] if color_index >= 0 else None
+    for color_index in _COLOR_LUT.ravel().tolist()
+)
+
+
+def _color_bin(value):
+    """Bin of a single channel value, see _COLOR_EDGES."""
+    return bisect_left(_COLOR_EDGES, value) + bisect_right(_COLOR_EDGES, value)
+
+
+def _classify_rgb(rgb):
+    """Bin an (N, 3) array of 0-1 RGB values, all channels at once.
+
+    Returns an index into _COLOR_NAME_LUT per row.
+    """
+    bins = np.searchsorted(_COLOR_EDGES, rgb, side='left') + np.searchsorted(_COLOR_EDGES, rgb, side='right')
+    return bins @ (81, 9, 1)
+
+
+class _PageWords:
+    """Words of a single page, with each box coordinate in its own contiguous array."""
+
+    def __init__(self, words):
+        self.words = words
+        self.texts = [w[4] for w in words]
+        self.x0 = np.fromiter((w[0] for w in words), dtype=np.float32, count=len(words))
+        self.y0 = np.fromiter((w[1] for w in words), dtype=np.float32, count=len(words))
+        self.x1 = np.fromiter((w[2] for w in words), dtype=np.float32, count=len(words))
+        self.y1 = np.fromiter((w[3] for w in words), dtype=np.float32, count=len(words))
+        # Word centers, shared by every selection and ordering on the page
+        self.cx = 0.5 * (self.x0 + self.x1)
+        self.cy = 0.5 * (self.y0 + self.y1)
+        # Interval index over the words' top edges, see `_y_band`
+        self._y0_order = np.argsort(self.y0, kind='stable')
+        self._y0_sorted = self.y0[self._y0_order]
+        self._max_height = float((self.y1 - self.y0).max()) if len(words) else 0.0
+        # Word indices sorted by vertical center, see `centered_in`
+        self._cy_order = np.argsort(self.cy, kind='stable')
+        self._cy_sorted = self.cy[self._cy_order]
+
+    def _y_band(self, qy0, qy1):
+        """Indices, in page order, of the words that may reach into the band qy0..qy1.
+
+        A word can only reach into the band if its top edge lies above qy1 and
+        less than the tallest word's height above qy0, so two binary searches
+        over the sorted top edges narrow the candidates before any box is compared.
+        """
+        lo = np.searchsorted(self._y0_sorted, qy0 - self._max_height, side='right')
+        hi = np.searchsorted(self._y0_sorted, qy1, side='left')
+        return np.sort(self._y0_order[lo:hi])
+
+    def overlapping(self, rect, min_ratio):
+        """Indices of words whose area lies at least `min_ratio` (> 0) inside `rect`."""
+        if len(self.words) < _VECTORIZE_MIN_WORDS:
+            return self._overlapping_scalar(rect, min_ratio)
+        
+        candidates = self._y_band(rect[1], rect[3])
+        x0, y0 = self.x0[candidates], self.y0[candidates]
+        x1, y1 = self.x1[candidates], self.y1[candidates]
+        iw = np.clip(np.minimum(x1, rect[2]) - np.maximum(x0, rect[0]), 0, None)
+        ih = np.clip(np.minimum(y1, rect[3]) - np.maximum(y0, rect[1]), 0, None)
+        area = (x1 - x0) * (y1 - y0)
+        mask = (iw * ih) / np.maximum(area, 1e-6) >= min_ratio
+        return candidates[mask]
+
+    def _overlapping_scalar(self, rect, min_ratio):
+        """Plain-Python `overlapping` for pages too small to amortize NumPy's setup."""
+        hx0, hy0, hx1, hy1 = rect[0], rect[1], rect[2], rect[3]
+        selected = []
+        for i, word in enumerate(self.words):
+            x0, y0, x1, y1 = word[0], word[1], word[2], word[3]
+            ix0 = max(x0, hx0)
+            iy0 = max(y0, hy0)
+            ix1 = min(x1, hx1)
+            iy1 = min(y1, hy1)
+            if ix1 > ix0 and iy1 > iy0:
+                area = (x1 - x0) * (y1 - y0)
+                if (ix1 - ix0) * (iy1 - iy0) / max(area, 1e-6) >= min_ratio:
+                    selected.append(i)
+        return np.array(selected, dtype=np.intp)
+
+    def intersecting(self, rect):
+        """Indices of words whose box intersects `rect`, in page order."""
+        qx0, qy0, qx1, qy1 = rect
+        candidates = self._y_band(qy0, qy1)
+        
+        x0, y0 = self.x0[candidates], self.y0[candidates]
+        x1, y1 = self.x1[candidates], self.y1[candidates]
+        mask = (x0 < qx1) & (x1 > qx0) & (y0 < qy1) & (y1 > qy0) & (x1 > x0) & (y1 > y0)
+        return candidates[mask]
+
+    def centered_in(self, rects):
+        """Indices of words whose center lies inside any of `rects`, each word listed once."""
+        # Words covered by several quads are marked once in the bitmap
+        selected = np.zeros(len(self.texts), dtype=bool)
+        for x0, y0, x1, y1 in rects:
+            # Binary search the centers within y0..y1, then filter that slice on x
+            lo = np.searchsorted(self._cy_sorted, y0, side='left')
+            hi = np.searchsorted(self._cy_sorted, y1, side='right')
+            band = self._cy_order[lo:hi]
+            cx = self.cx[band]
+            selected[band[(cx >= x0) & (cx <= x1)]] = True
+        return np.flatnonzero(selected)
+
+    def in_reading_order(self, indices, line_tolerance=5):
+        """Order word indices line by line (top to bottom), left to right within a line."""
+        if len(indices) == 0:
+            return indices
+        cy = self.cy[indices]
+        cx = self.cx[indices]
+        
+        # Split the y-sorted words wherever the gap between centers exceeds the tolerance
+        order = np.argsort(cy, kind='stable')
+        splits = np.where(np.diff(cy[order]) > line_tolerance)[0] + 1
+        lines = [line[np.argsort(cx[line], kind='stable')] for line in np.split(order, splits)]
+        return indices[np.concatenate(lines)]
+
+
+class _PageText:
+    """Text of a single page, parsed on first use and shared by every lookup on it."""
+
+    def __init__(self, page):
+        self.page = page
+
+    @cached_property
+    def textpage(self):
+        """The page's parsed TextPage."""
+        return self.page.get_textpage(flags=_TEXTPAGE_FLAGS)
+
+    @cached_property
+    def words(self):
+        """The page's ``get_text("words")`` output as `_PageWords`."""
+        # [(x0, y0, x1, y1, "word", block_no, line_no, word_no)]
+        return _PageWords(self.page.get_text("words", textpage=self.textpage))
+
+
 class PDFHighlightExtractor:
     def __init__(self, pdf_path):
         self.pdf_path = Path(pdf_path)
         self.annotations = []
         self.highlights = []
+        self._partial_cache = {}
 
-    def extract_annotation_highlights(self):
-        """Extract ALL types of annotations with improved processing."""
+    def extract_annotations_and_highlights(self):
+        """Extract annotations and background highlights in a single PyMuPDF pass."""
         annotations = []
+        highlights = []
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                print(f"📄 Processing annotations...")
-                for page_num, page in enumerate(pdf.pages, 1):
-                    if hasattr(page, 'annots') and page.annots:
-                        page_annotations = 0
-                        for i, annot in enumerate(page.annots):
-                            try:
-                                annot_type = annot.get('subtype', 'Unknown')
-                                
-                                # Process all annotation types
-                                if annot_type in ['Highlight', 'Squiggly', 'StrikeOut', 'Underline', 'FreeText', 'Text']:
-                                    rect = annot.get('rect', [])
-                                    
-                                    # Try multiple text extraction methods
-                                    text = self._get_annotation_text(page, annot, rect)
-                                    color = self._get_color_from_annot(annot)
-                                    
-                                    if text and text.strip():
-                                        annotations.append({
-                                            'page': page_num,
-                                            'text': self._clean_text(text),
-                                            'color': color,
-                                            'type': f'annotation_{annot_type.lower()}',
-                                            'coordinates': rect,
-                                            'y_position': rect[1] if len(rect) >= 4 else 0
-                                        })
-                                        page_annotations += 1
-                            except Exception as e:
-                                continue
-                        
-                        if page_annotations > 0:
-                            print(f"  ✅ Page {page_num}: Found {page_annotations} annotations")
+            print(f"📄 Processing annotations and highlights...")
+            for page_num, (page_annotations, page_highlights) in enumerate(self.iter_pages()):
+                if page_annotations:
+                    annotations.extend(page_annotations)
+                    logger.info("  ✅ Page %d: Found %d annotations", page_num + 1, len(page_annotations))
+                if page_highlights:
+                    highlights.extend(page_highlights)
+                    logger.info("  ✅ Page %d: Found %d highlights", page_num + 1, len(page_highlights))
             
             print(f"  📊 Total annotations: {len(annotations)}")
+            print(f"  📊 Total highlights: {len(highlights)}")
         except Exception as e:
-            print(f"❌ Error reading annotations: {e}")
+            logger.error("❌ Error reading PDF: %s", e)
         
-        return annotations
+        return annotations, highlights
 
-    def _get_annotation_text(self, page, annot, rect):
-        """Try multiple methods to extract annotation text."""
+    def iter_pages(self):
+        """Yield the ``(annotations, highlights)`` of each page, in page order."""
+        doc = fitz.open(str(self.pdf_path))
+        page_count = doc.page_count
+        
+        if page_count > _PARALLEL_PAGE_THRESHOLD:
+            # Large documents: spread pages over worker processes
+            doc.close()
+            workers = min(os.cpu_count() or 1, _MAX_WORKERS)
+            chunksize = max(1, page_count // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(logger.getEffectiveLevel(),)) as executor:
+                yield from executor.map(
+                    _process_page, repeat(str(self.pdf_path)), range(page_count), chunksize=chunksize)
+        else:
+            try:
+                for page_num in range(page_count):
+                    yield self._extract_page(doc[page_num], page_num)
+            finally:
+                doc.close()
+
+    def _extract_page(self, page, page_num):
+        """Extract the annotations and background highlights of a single page."""
+        annotations = []
+        highlight_annots = []
+        
+        # Parse the page's text on first use only; every text lookup below
+        # reuses it, and pages with no highlights and only annotations that
+        # carry contents skip it
+        page_text = _PageText(page)
+        
+        for annot in page.annots(types=_ANNOTATION_TYPES):
+            try:
+                # Read each annotation property through the bindings only once
+                annot_type = annot.type[1]
+                colors = annot.colors
+                r = annot.rect
+                rect = (r.x0, r.y0, r.x1, r.y1)
+                info = annot.info
+                
+                # Words under a text markup's quads, worked out once for both
+                # its annotation record and, for highlights, its highlight record
+                marked_text = None
+                if annot_type in _TEXT_MARKUP_TYPES and (
+                        annot_type == 'Highlight' or not info.get('content', '').strip()):
+                    marked_text = self._extract_text_from_rect_pymupdf(
+                        page, rect, page_text.words, page_text.textpage, annot.vertices)
+                
+                # Try multiple text extraction methods
+                text = self._get_annotation_text(info, rect, marked_text, page_text)
+                color = self._rgb_to_color_name(colors.get('stroke'))
+                
+                if text and text.strip():
+                    annotations.append({
+                        'page': page_num + 1,
+                        'text': self._clean_text(text),
+                        'color': color,
+                        'type': f'annotation_{annot_type.lower()}',
+                        'coordinates': list(rect),
+                        'y_position': rect[1]
+                    })
+                
+                if annot_type == 'Highlight':
+                    highlight_annots.append((colors, rect, marked_text))
+            except Exception:
+                logger.debug("    ⚠️ Page %d: skipped an annotation", page_num + 1, exc_info=True)
+                continue
+        
+        if not highlight_annots:
+            return annotations, []
+        
+        # Duplicates only ever share a page, so deduplicate page by page
+        highlights = self._extract_page_highlights(page_num, highlight_annots, page_text)
+        return annotations, self._smart_deduplicate(highlights)
+
+    def _get_annotation_text(self, info, rect, marked_text, page_text):
+        """Try multiple methods to extract annotation text.
+
+        `info` is the annotation's info dict, `marked_text` the words under a
+        text markup's quads (None when they weren't worked out) and
+        `page_text` the page's shared `_PageText`.
+        """
         # Method 1: From annotation contents
-        text = annot.get('contents', '').strip()
+        text = info.get('content', '').strip()
         if text:
             return text
         
-        # Method 2: From rect area
-        if rect and len(rect) == 4:
+        # Method 2: From the marked area. A text markup's rect spans whole
+        # neighbouring lines, so its words are picked by its quads instead,
+        # as for the highlight records
+        if marked_text is not None:
+            text = marked_text
+        else:
             try:
-                x0, y0, x1, y1 = rect
-                cropped = page.crop((x0-1, y0-1, x1+1, y1+1))
-                text = cropped.extract_text()
-                if text and text.strip():
-                    return text.strip()
-            except:
-                pass
+                text = page_text.page.get_textbox(rect, textpage=page_text.textpage)
+            except _MUPDF_ERRORS:
+                text = None
+        if text and text.strip():
+            return text.strip()
         
         # Method 3: From annotation object properties
-        for prop in ['label', 'title', 'subject']:
-            text = annot.get(prop, '').strip()
+        for prop in ['title', 'subject']:
+            text = info.get(prop, '').strip()
             if text:
                 return text
         
         return ""
 
-    def extract_background_highlights(self):
-        """Extract background highlights with word completion."""
+    def _extract_page_highlights(self, page_num, highlight_annots, page_text):
+        """Extract background highlights with word completion.
+
+        `highlight_annots` holds ``(colors, rect, text)`` for each highlight
+        annotation on the page, with `rect` as a plain 4-tuple and `text` the
+        words under its quads. `page_text` is the page's shared `_PageText`.
+        """
         highlights = []
-        try:
-            print(f"\n🎨 Processing highlights...")
-            doc = fitz.open(str(self.pdf_path))
-            
-            for page_num in range(doc.page_count):
-                page = doc[page_num]
-                page_highlights = 0
-                
-                # Get all text words on the page for word completion
-                all_words = page.get_text("words")  # [(x0, y0, x1, y1, "word", block_no, line_no, word_no)]
-                
-                annotations = page.annots()
-                for annot in annotations:
-                    try:
-                        if annot.type[1] == 'Highlight':
-                            # Get color information
-                            colors = annot.colors
-                            color_name = self._analyze_highlight_color(colors)
-                            
-                            if color_name != 'unknown':
-                                # Extract text from highlighted area
-                                rect = annot.rect
-                                highlight_text = self._extract_text_from_rect_pymupdf(page, rect)
-                                
-                                if highlight_text and len(highlight_text.strip()) > 2:
-                                    # Complete partial words at start and end
-                                    completed_text = self._complete_partial_words(highlight_text, rect, all_words)
-                                    clean_text = self._clean_text(completed_text)
-                                    
-                                    # Create highlight entry
-                                    highlight_entry = {
-                                        'page': page_num + 1,
-                                        'text': clean_text,
-                                        'color': color_name,
-                                        'type': 'highlight',
-                                        'coordinates': list(rect),
-                                        'y_position': rect.y0
-                                    }
-                                    
-                                    highlights.append(highlight_entry)
-                                    page_highlights += 1
-                    except Exception as e:
-                        continue
-                
-                if page_highlights > 0:
-                    print(f"  ✅ Page {page_num + 1}: Found {page_highlights} highlights")
-                    
-            doc.close()
-            print(f"  📊 Total highlights: {len(highlights)}")
-        except Exception as e:
-            print(f"❌ Error reading highlights: {e}")
+        
+        # Classify the colors of all highlights on the page in one batch
+        color_names = self._analyze_highlight_colors([colors for colors, rect, text in highlight_annots])
+        if all(color_name == 'unknown' for color_name in color_names):
+            return highlights
+        
+        # Get all text words on the page for word completion
+        page_words = page_text.words
+        
+        for (colors, rect, highlight_text), color_name in zip(highlight_annots, color_names):
+            try:
+                if color_name != 'unknown':
+                    if highlight_text and len(highlight_text.strip()) > 2:
+                        # Complete partial words at start and end
+                        completed_text = self._complete_partial_words(highlight_text, rect, page_words)
+                        clean_text = self._clean_text(completed_text)
+                        
+                        # Create highlight entry
+                        highlight_entry = {
+                            'page': page_num + 1,
+                            'text': clean_text,
+                            'color': color_name,
+                            'type': 'highlight',
+                            'coordinates': list(rect),
+                            'y_position': rect[1]
+                        }
+                        
+                        highlights.append(highlight_entry)
+            except Exception:
+                logger.debug("    ⚠️ Page %d: skipped a highlight", page_num + 1, exc_info=True)
+                continue
         
         return highlights
 
-    def _complete_partial_words(self, highlight_text, rect, all_words):
+    def _complete_partial_words(self, highlight_text, rect, page_words):
         """Complete partial words at the beginning and end of highlights."""
-        if not highlight_text or not all_words:
+        if not highlight_text or not page_words.words:
             return highlight_text
         
         words = highlight_text.split()
@@ -152,42 +434,39 @@ class PDFHighlightExtractor:
         
         first_word = words[0]
         last_word = words[-1]
-        
-        # Find words that intersect with the highlight rectangle
-        highlight_rect = fitz.Rect(rect)
-        nearby_words = []
-        
-        for word_info in all_words:
-            word_rect = fitz.Rect(word_info[:4])
-            word_text = word_info[4]
-            
-            # Check if word is near the highlight area (within expanded boundaries)
-            expanded_rect = fitz.Rect(
-                highlight_rect.x0 - 50,  # Expand left
-                highlight_rect.y0 - 5,   # Expand up
-                highlight_rect.x1 + 50,  # Expand right
-                highlight_rect.y1 + 5    # Expand down
-            )
-            
-            if word_rect.intersects(expanded_rect):
-                nearby_words.append((word_rect, word_text))
+        first_partial = len(first_word) >= 3 and self._is_likely_partial(first_word)
+        last_partial = len(last_word) >= 3 and self._is_likely_partial(last_word)
+        
+        # Most highlights start and end on whole words; skip the neighbour lookup
+        if not (first_partial or last_partial):
+            return ' '.join(words)
+        
+        # Find words near the highlight area (within expanded boundaries)
+        expanded_rect = (
+            rect[0] - 50,  # Expand left
+            rect[1] - 5,   # Expand up
+            rect[2] + 50,  # Expand right
+            rect[3] + 5    # Expand down
+        )
+        nearby = page_words.intersecting(expanded_rect)
         
         # Sort by position (left to right, top to bottom)
-        nearby_words.sort(key=lambda x: (x[0].y0, x[0].x0))
+        nearby = nearby[np.lexsort((page_words.x0[nearby], page_words.y0[nearby]))]
+        nearby_words = [page_words.texts[i] for i in nearby]
         
         # Complete first word if it seems partial
-        if len(first_word) >= 3 and self._is_likely_partial(first_word):
+        if first_partial:
             completed_first = self._find_complete_word(first_word, nearby_words, 'start')
             if completed_first and completed_first != first_word:
                 words[0] = completed_first
-                print(f"    🔧 Completed first word: '{first_word}' → '{completed_first}'")
+                logger.debug("    🔧 Completed first word: '%s' → '%s'", first_word, completed_first)
         
         # Complete last word if it seems partial
-        if len(last_word) >= 3 and self._is_likely_partial(last_word):
+        if last_partial:
             completed_last = self._find_complete_word(last_word, nearby_words, 'end')
             if completed_last and completed_last != last_word:
                 words[-1] = completed_last
-                print(f"    🔧 Completed last word: '{last_word}' → '{completed_last}'")
+                logger.debug("    🔧 Completed last word: '%s' → '%s'", last_word, completed_last)
         
         return ' '.join(words)
 
@@ -196,29 +475,28 @@ class PDFHighlightExtractor:
         if not word:
             return False
         
-        # Common indicators of partial words
-        partial_indicators = [
-            len(word) < 3,  # Very short
-            word.endswith('-'),  # Hyphenated break
-            not word.isalpha() and not word[-1].isalpha(),  # Ends with punctuation
-            word.lower() in ['the', 'and', 'of', 'to', 'in', 'for', 'with'],  # Complete common words
-        ]
+        # The same words recur across a document's highlights
+        partial = self._partial_cache.get(word)
+        if partial is None:
+            partial = self._partial_cache[word] = self._check_partial(word)
+        return partial
+
+    def _check_partial(self, word):
+        """Uncached `_is_likely_partial` for a non-empty word."""
+        word_lower = word.lower()
         
         # If it's a common complete word, it's not partial
-        if word.lower() in ['the', 'and', 'of', 'to', 'in', 'for', 'with', 'a', 'an', 'is', 'are', 'was', 'were']:
+        if word_lower in _COMPLETE_WORDS:
             return False
         
-        # Check for incomplete endings (consonant clusters that suggest more letters)
         if len(word) >= 4:
-            ending = word[-2:].lower()
-            incomplete_endings = ['th', 'st', 'nd', 'rd', 'ch', 'sh', 'nt', 'mp', 'ck', 'ng']
-            if any(word.lower().endswith(end) for end in incomplete_endings):
+            # Check for incomplete endings (consonant clusters that suggest more letters)
+            if word_lower.endswith(_INCOMPLETE_ENDINGS):
+                return True
+            
+            # Check if it doesn't end with typical word endings
+            if not word_lower.endswith(_COMMON_ENDINGS):
                 return True
-        
-        # Check if it doesn't end with typical word endings
-        common_endings = ['ed', 'ing', 'er', 'est', 'ly', 'ion', 'tion', 'ment', 'ness', 'ful', 'less', 'able', 'ible']
-        if len(word) >= 4 and not any(word.lower().endswith(end) for end in common_endings):
-            return True
         
         return False
 
@@ -228,7 +506,7 @@ class PDFHighlightExtractor:
         
         candidates = []
         
-        for word_rect, full_word in nearby_words:
+        for full_word in nearby_words:
             full_word_lower = full_word.lower()
             
             if position == 'start':
@@ -242,62 +520,59 @@ class PDFHighlightExtractor:
         
         # Return the longest candidate (most likely to be the complete word)
         if candidates:
-            candidates.sort(key=lambda x: x[1], reverse=True)
-            return candidates[0][0]
+            return max(candidates, key=itemgetter(1))[0]
         
         return partial_word
 
-    def _extract_text_from_rect_pymupdf(self, page, rect):
-        """Extract text from rectangle using multiple PyMuPDF methods."""
-        try:
-            # Method 1: Direct text extraction
-            text = page.get_text("text", clip=rect)
-            if text and text.strip():
-                return text.strip()
-            
-            # Method 2: Textbox method
-            text = page.get_textbox(rect)
-            if text and text.strip():
-                return text.strip()
-            
-            # Method 3: Expanded rectangle
-            expanded_rect = fitz.Rect(rect.x0 - 2, rect.y0 - 2, rect.x1 + 2, rect.y1 + 2)
-            text_dict = page.get_text("dict", clip=expanded_rect)
-            
-            text_parts = []
-            for block in text_dict.get("blocks", []):
-                if "lines" in block:
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            if span["text"].strip():
-                                text_parts.append(span["text"])
+    def _extract_text_from_rect_pymupdf(self, page, rect, page_words, textpage, vertices=None):
+        """Extract text from rectangle using multiple PyMuPDF methods.
+
+        `page_words` holds the page's cached ``get_text("words")`` output and
+        `textpage` its parsed TextPage, both reused here so no method re-parses
+        the page per highlight. `vertices` are the annotation's quad points,
+        when the PDF producer stored them.
+        """
+        # Method 0: Words centered inside the highlight's quads
+        if vertices:
+            quad_rects = []
+            for i in range(0, len(vertices) - 3, 4):
+                xs = [point[0] for point in vertices[i:i + 4]]
+                ys = [point[1] for point in vertices[i:i + 4]]
+                quad_rects.append((min(xs), min(ys), max(xs), max(ys)))
             
-            return " ".join(text_parts)
-        except:
+            selected = page_words.in_reading_order(page_words.centered_in(quad_rects))
+            if len(selected):
+                return " ".join(page_words.texts[i] for i in selected)
+        
+        # Method 1: Words centered inside the highlight rectangle
+        selected = page_words.in_reading_order(page_words.centered_in([rect]))
+        if len(selected):
+            return " ".join(page_words.texts[i] for i in selected)
+        
+        # Method 2: Words mostly inside an expanded rectangle
+        expanded_rect = (rect[0] - 2, rect[1] - 2, rect[2] + 2, rect[3] + 2)
+        selected = page_words.in_reading_order(page_words.overlapping(expanded_rect, 0.40))
+        if len(selected):
+            return " ".join(page_words.texts[i] for i in selected)
+        
+        # Method 3: Textbox on the page's shared TextPage
+        try:
+            text = page.get_textbox(rect, textpage=textpage)
+        except _MUPDF_ERRORS:
             return ""
+        return text.strip() if text else ""
 
-    def _analyze_highlight_color(self, colors):
-        """Analyze highlight color with improved detection."""
-        if not colors:
-            return 'unknown'
-        
-        # Check fill color first (highlight background)
-        if 'fill' in colors and colors['fill']:
-            return self._rgb_to_color_name(colors['fill'])
-        elif 'stroke' in colors and colors['stroke']:
-            return self._rgb_to_color_name(colors['stroke'])
-        
-        return 'unknown'
-
-    def _get_color_from_annot(self, annot):
-        """Get color from pdfplumber annotation."""
-        try:
-            color = annot.get('color', [])
-            if color:
-                return self._rgb_to_color_name(color)
-        except:
-            pass
-        return 'unknown'
+    def _analyze_highlight_colors(self, colors_list):
+        """Analyze the colors of a batch of highlights with improved detection."""
+        rgbs = []
+        for colors in colors_list:
+            # Check fill color first (highlight background)
+            rgb = None
+            if colors:
+                rgb = colors.get('fill') or colors.get('stroke')
+            rgbs.append(rgb)
+        
+        return self._rgb_to_color_names(rgbs)
 
     def _rgb_to_color_name(self, rgb):
         """Convert RGB values to color names with improved precision."""
@@ -305,40 +580,45 @@ class PDFHighlightExtractor:
             return 'unknown'
         
         r, g, b = rgb[:3]
-        
-        # Precise color detection
-        if r > 0.7 and g > 0.7 and b < 0.6:
-            return 'yellow'
-        elif r < 0.6 and g > 0.7 and b < 0.6:
-            return 'green'
-        elif r < 0.6 and g < 0.8 and b > 0.7:
-            return 'blue'
-        elif r > 0.7 and g < 0.6 and b > 0.7:
-            return 'pink'
-        elif r > 0.8 and g > 0.5 and b < 0.5:
-            return 'orange'
-        elif r > 0.7 and g < 0.5 and b < 0.5:
-            return 'red'
-        elif r < 0.5 and g > 0.7 and b > 0.7:
-            return 'cyan'
-        else:
-            return f'rgb({r:.2f},{g:.2f},{b:.2f})'
+        name = _COLOR_NAME_LUT[_color_bin(r) * 81 + _color_bin(g) * 9 + _color_bin(b)]
+        if name is not None:
+            return name
+        return f'rgb({r:.2f},{g:.2f},{b:.2f})'
+
+    def _rgb_to_color_names(self, rgbs):
+        """Convert a batch of RGB values to color names in one vectorized pass."""
+        names = ['unknown'] * len(rgbs)
+        valid = [i for i, rgb in enumerate(rgbs) if rgb and len(rgb) >= 3]
+        if not valid:
+            return names
+        
+        batch = np.asarray([rgbs[i][:3] for i in valid], dtype=np.float64)
+        for i, lut_index in zip(valid, _classify_rgb(batch).tolist()):
+            name = _COLOR_NAME_LUT[lut_index]
+            if name is None:
+                r, g, b = rgbs[i][:3]
+                name = f'rgb({r:.2f},{g:.2f},{b:.2f})'
+            names[i] = name
+        
+        return names
 
     def _clean_text(self, text):
         """Clean and normalize text."""
         if not text:
             return ""
         
-        try:
-            # Remove extra whitespace and normalize
-            text = re.sub(r'\s+', ' ', text.strip())
-            # Remove line break hyphens
-            text = re.sub(r'-\s+', '', text)
-            # Fix punctuation spacing
-            text = re.sub(r'\s+([.,;:!?])', r'\1', text)
-            return text
-        except:
-            return str(text) if text else ""
+        # Remove extra whitespace and normalize
+        text = _WS_RE.sub(' ', text.strip())
+        # Line break hyphens and detached punctuation both need a space, which
+        # single words (most partial highlights) never contain
+        if ' ' not in text:
+            return text.translate(_SOFT_HYPHEN_TABLE)
+        
+        # Remove line break hyphens, then any remaining soft hyphens
+        text = _LINE_BREAK_HYPHEN_RE.sub('', text)
+        text = text.translate(_SOFT_HYPHEN_TABLE)
+        # Fix punctuation spacing
+        return _SPACE_BEFORE_PUNCT_RE.sub(r'\1', text)
 
     def _smart_deduplicate(self, items):
         """Smart deduplication that merges similar highlights."""
@@ -348,19 +628,32 @@ class PDFHighlightExtractor:
         # Sort by page and position
         items.sort(key=lambda x: (x['page'], x['y_position'], len(x['text'])))
         
+        # Kept items are bucketed by page, color and 10pt band of y_position, so
+        # an item is only compared with kept items in its own or adjacent bands
+        buckets = defaultdict(list)
         unique_items = []
+        unique_texts = []  # lowercased text of each kept item
+        unique_words = []  # word set of each kept item
+        
         for item in items:
             is_duplicate = False
+            page, color, y = item['page'], item['color'], item['y_position']
+            band = int(y // 10)
+            candidates = sorted(
+                index
+                for nearby_band in (band - 1, band, band + 1)
+                for index in buckets.get((page, color, nearby_band), ())
+            )
             
-            for existing in unique_items:
+            item_text = item['text'].lower().strip()
+            item_words = None
+            for index in candidates:
+                existing = unique_items[index]
                 # Check if this is a duplicate or subset
-                if (item['page'] == existing['page'] and 
-                    item['color'] == existing['color'] and
-                    abs(item['y_position'] - existing['y_position']) < 10):
+                if abs(y - existing['y_position']) < 10:
                     
                     # Check text similarity
-                    item_text = item['text'].lower().strip()
-                    existing_text = existing['text'].lower().strip()
+                    existing_text = unique_texts[index]
                     
                     # If one is substring of another, keep the longer one
                     if item_text in existing_text:
@@ -369,48 +662,52 @@ class PDFHighlightExtractor:
                     elif existing_text in item_text:
                         # Replace existing with longer text
                         existing['text'] = item['text']
+                        unique_texts[index] = item_text
+                        unique_words[index] = frozenset(item_text.split())
                         is_duplicate = True
                         break
+                    
                     # If very similar (90% overlap), it's a duplicate
-                    elif self._text_similarity(item_text, existing_text) > 0.9:
+                    if item_words is None:
+                        item_words = frozenset(item_text.split())
+                    if self._text_similarity(item_words, unique_words[index], 0.9) > 0.9:
                         is_duplicate = True
                         break
             
             if not is_duplicate:
+                buckets[(page, color, band)].append(len(unique_items))
                 unique_items.append(item)
+                unique_texts.append(item_text)
+                unique_words.append(item_words if item_words is not None else frozenset(item_text.split()))
         
         return unique_items
 
-    def _text_similarity(self, text1, text2):
-        """Calculate text similarity ratio."""
-        if not text1 or not text2:
-            return 0
-        
-        # Simple word-based similarity
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
+    def _text_similarity(self, words1, words2, threshold=0):
+        """Calculate the similarity ratio of two texts' word sets.
+
+        The ratio can't exceed the smaller set's share of the larger one, so
+        pairs whose sizes alone rule out reaching `threshold` return 0 without
+        intersecting the sets.
+        """
         if not words1 or not words2:
             return 0
         
-        intersection = len(words1.intersection(words2))
-        union = len(words1.union(words2))
+        len1, len2 = len(words1), len(words2)
+        if min(len1, len2) < threshold * max(len1, len2):
+            return 0
         
-        return intersection / union if union > 0 else 0
+        # |A ∪ B| = |A| + |B| - |A ∩ B|, so the union set is never built
+        intersection = len(words1 & words2)
+        return intersection / (len1 + len2 - intersection)
 
     def extract_all_highlights(self):
         """Extract and process all highlights and annotations."""
         print("🔍 PDF Highlight & Annotation Extractor")
         print("=" * 50)
         
-        # Extract annotations
-        self.annotations = self.extract_annotation_highlights()
-        
-        # Extract highlights  
-        self.highlights = self.extract_background_highlights()
-        
-        # Smart deduplication
-        self.highlights = self._smart_deduplicate(self.highlights)
+        # Extract annotations and highlights in one pass over the PDF
+        # (highlights come back already deduplicated page by page)
+        self.annotations, self.highlights = self.extract_annotations_and_highlights()
         
         print(f"\n✨ Processing complete!")
         print(f"   📝 Annotations: {len(self.annotations)}")
@@ -420,7 +717,7 @@ class PDFHighlightExtractor:
 
     def sort_by_position(self, items):
         """Sort items by page, then top to bottom."""
-        return sorted(items, key=lambda x: (x['page'], x['y_position']))
+        return sorted(items, key=itemgetter('page', 'y_position'))
 
     def save_to_json(self, annotations, highlights, output_path):
         """Save results to JSON file."""
@@ -430,28 +727,32 @@ class PDFHighlightExtractor:
             'summary': {
                 'total_annotations': len(annotations),
                 'total_highlights': len(highlights),
-                'annotation_colors': list(set(a['color'] for a in annotations)),
-                'highlight_colors': list(set(h['color'] for h in highlights))
+                'annotation_colors': list({a['color'] for a in annotations}),
+                'highlight_colors': list({h['color'] for h in highlights})
             }
         }
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
         print(f"💾 Saved to {output_path}")
 
     def save_to_csv(self, annotations, highlights, output_path):
         """Save results to CSV file."""
-        all_items = []
-        for item in annotations:
-            item_copy = item.copy()
-            item_copy['category'] = 'annotation'
-            all_items.append(item_copy)
-        for item in highlights:
-            item_copy = item.copy()
-            item_copy['category'] = 'highlight'
-            all_items.append(item_copy)
-        
-        df = pd.DataFrame(all_items)
-        df.to_csv(output_path, index=False, encoding='utf-8')
+        # Rows are tagged and written one at a time, as plain lists read
+        # straight off the records, without collecting or copying them.
+        # Records missing a column get an empty cell; extra keys are ignored.
+        fields = _CSV_FIELDNAMES[1:]
+        rows = chain(
+            (['annotation', *[item.get(field, '') for field in fields]] for item in annotations),
+            (['highlight', *[item.get(field, '') for field in fields]] for item in highlights),
+        )
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(_CSV_FIELDNAMES)
+            writer.writerows(rows)
         print(f"📊 Saved to {output_path}")
 
     def display_results(self):
@@ -505,7 +806,40 @@ class PDFHighlightExtractor:
         return color_map.get(color_name, Back.WHITE + Fore.BLACK)
 
 
+# Documents opened by a worker process, with the extractor working on them,
+# kept across the pages it is handed. They are never closed explicitly and
+# live until the worker process exits with the pool.
+_worker_documents = {}
+
+
+def _init_worker(log_level):
+    """Apply the parent's log level in a new worker process.
+
+    Workers started with the spawn method (macOS, Windows) don't inherit the
+    parent's logging setup, which would drop the --verbose details.
+    """
+    logging.basicConfig(level=log_level, format=_LOG_FORMAT)
+
+
+def _process_page(pdf_path, page_num):
+    """Extract the annotations and highlights of one page inside a worker process.
+
+    PyMuPDF objects can't cross process boundaries, so each worker opens the
+    document itself and only plain dicts are sent back.
+    """
+    if pdf_path not in _worker_documents:
+        _worker_documents[pdf_path] = (fitz.open(pdf_path), PDFHighlightExtractor(pdf_path))
+    doc, extractor = _worker_documents[pdf_path]
+    return extractor._extract_page(doc[page_num], page_num)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Extract highlights and annotations from a PDF.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="show per-page progress and word completion details")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format=_LOG_FORMAT)
+    
     print("🎨 PDF Highlight & Annotation Extractor")
     print("🚀 Enhanced with smart word completion and deduplication")
     print()